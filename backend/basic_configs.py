@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 
 # file upload cache path
 CACHE_PATH: str = "./cache_folder"
@@ -8,4 +8,34 @@ STANDARD_PATH: str = "./standard_folder"
 # text spliter
 CHUNK_SIZE: int = 1000
 CHUNK_OVERLAP: int = 100
-SEPARATORS: List[str] = ["\n\n", "\n", ".", ";", ",", " ", "。", "；", "，", "！"]
\ No newline at end of file
+SEPARATORS: List[str] = ["\n\n", "\n", ".", ";", ",", " ", "。", "；", "，", "！"]
+# 合并相邻分片时，重叠部分至少达到该长度才视为CHUNK_OVERLAP并去除
+MIN_CHUNK_OVERLAP: int = 20
+
+# context assembler
+RETRIEVE_TOP_K: int = 4
+MMR_LAMBDA: float = 0.7
+DEFAULT_CONTEXT_TOKEN_BUDGET: int = 2048
+# 每个chat model可用于拼接检索内容的token预算，未列出的模型使用DEFAULT_CONTEXT_TOKEN_BUDGET
+CONTEXT_TOKEN_BUDGETS: Dict[str, int] = {
+    "mistralai/mixtral-8x7b-instruct-v0.1": 4096,
+    "meta/llama3-8b-instruct": 2048,
+    "meta/llama3-70b-instruct": 2048,
+}
+
+# summarizer
+SUMMARY_MAX_CONCURRENCY: int = 4
+# summary_prompt模板及token估算误差预留、ChatNVIDIA默认max_tokens输出预留
+SUMMARY_PROMPT_TOKENS: int = 512
+SUMMARY_OUTPUT_TOKENS: int = 1024
+# 每个chat model单次总结的输入token预算 = 模型上下文窗口 - prompt预留 - 输出预留
+DEFAULT_SUMMARY_TOKEN_BUDGET: int = 4096 - SUMMARY_PROMPT_TOKENS - SUMMARY_OUTPUT_TOKENS
+SUMMARY_TOKEN_BUDGETS: Dict[str, int] = {
+    "mistralai/mixtral-8x7b-instruct-v0.1": 32768 - SUMMARY_PROMPT_TOKENS - SUMMARY_OUTPUT_TOKENS,
+    "meta/llama3-8b-instruct": 8192 - SUMMARY_PROMPT_TOKENS - SUMMARY_OUTPUT_TOKENS,
+    "meta/llama3-70b-instruct": 8192 - SUMMARY_PROMPT_TOKENS - SUMMARY_OUTPUT_TOKENS,
+}
+
+# semantic answer cache
+ANSWER_CACHE_MAX_ENTRIES: int = 256
+ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
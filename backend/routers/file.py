@@ -22,7 +22,7 @@ from ..exceptions import (
     file_type_exception,
     nvapi_verify_failed_ws_exception
 )
-from ..tools import nvapi_verify
+from ..tools import nvapi_verify, answer_cache
 from ..types import UploadFileDB, FileEmbeddedResponse
 from ..lifespanDB import get_cache_db
 from ..basic_configs import CACHE_PATH, CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS
@@ -146,6 +146,9 @@ async def embedded_file(
     standard_store = FAISS.from_documents(doc_chunks, embedder)
     standard_store.save_local(folder_path=os.path.join(CACHE_PATH, result.md5_code), index_name=result.md5_code)
 
+    # standard重新embed后，旧的语义回答缓存失效
+    answer_cache.invalidate(result.md5_code)
+
     # update DB
     with Session(cache_db) as session:
         statement = select(UploadFileDB).where(UploadFileDB.id == file_id)
@@ -2,21 +2,31 @@ import json
 import os.path
 import uuid
 import logging
+from typing import List
 
 from fastapi import APIRouter, WebSocket
 from langchain_community.vectorstores import FAISS
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableLambda
 from langchain_nvidia_ai_endpoints import ChatNVIDIA, NVIDIAEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from operator import itemgetter
 
 from ..basic_configs import CACHE_PATH, CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS
 from ..exceptions import file_notEmbedded_ws_exception, nvapi_verify_failed_ws_exception
-from ..prompt_template import decomposition_prompt, check_prompt, summary_prompt, query_prompt
+from ..prompt_template import decomposition_prompt, check_prompt, query_prompt
 from ..types import InvokeResponse, UploadFileDB
 from .file import verify_file_exists, file_loader
-from ..tools import nvapi_verify
+from ..tools import (
+    nvapi_verify,
+    assemble_context,
+    render_context,
+    embed_queries,
+    get_context_budget,
+    tree_summarize,
+    get_summary_budget,
+    answer_cache,
+    AnswerCacheEntry
+)
 
 app_router = APIRouter(prefix="/api/invoke", tags=["invoke"])
 
@@ -47,9 +57,18 @@ async def query_standard(
     if standard_data.embedded_status != "embedded":
         raise file_notEmbedded_ws_exception
 
+    # 查询语义回答缓存，相似问题直接返回缓存的回答
+    embedder = NVIDIAEmbeddings(model=embedder_model, truncate="END", api_key=nv_api_key)
+    query_vectors = embed_queries(embedder, [question])
+    cached = answer_cache.lookup(standard_data.md5_code, chat_model, embedder_model, query_vectors[0])
+    if cached is not None:
+        logging.debug(f"answer cache hit: {question} -> {cached.question}")
+        await websocket.send_json(InvokeResponse(status="success", message="success", result=cached.answer).model_dump())
+        await websocket.close()
+        return
+
     # 加载standard faiss数据库
     await websocket.send_json(InvokeResponse(status="loading", message="start load faiss database").model_dump())
-    embedder = NVIDIAEmbeddings(model=embedder_model, truncate="END", api_key=nv_api_key)
     standard_store = FAISS.load_local(
         folder_path=os.path.join(CACHE_PATH, standard_data.md5_code),
         index_name=standard_data.md5_code,
@@ -59,12 +78,19 @@ async def query_standard(
 
     # query standard
     await websocket.send_json(InvokeResponse(status="querying", message="start query").model_dump())
-    retriever = standard_store.as_retriever()
+    context_chunks = assemble_context(standard_store, [question], token_budget=get_context_budget(chat_model),
+                                      query_vectors=query_vectors)
     instruct_llm = ChatNVIDIA(model=chat_model, api_key=nv_api_key)
     query_chain = {"question": itemgetter("question"),
-                   "standard": itemgetter("question") | retriever | RunnableLambda(lambda x: '\n'.join(
-                       [y.page_content for y in x]))} | query_prompt | instruct_llm | StrOutputParser()
+                   "standard": lambda x: render_context(context_chunks)} | query_prompt | instruct_llm | StrOutputParser()
     query_res = query_chain.invoke({"question": question})
+    answer_cache.add(standard_data.md5_code, chat_model, AnswerCacheEntry(
+        question=question,
+        embedder_model=embedder_model,
+        vector=query_vectors[0],
+        answer=query_res,
+        chunk_ids=[chunk_id for chunk in context_chunks for chunk_id in chunk.ids]
+    ))
 
     # send response
     await websocket.send_json(InvokeResponse(status="success", message="success", result=query_res).model_dump())
@@ -124,7 +150,7 @@ async def compare_schema_with_standard(
     # 使用llm从schema文件提取条目
     # await websocket.send_json(InvokeResponse(status="extracting", message="start extract schema entries").model_dump())
     instruct_llm = ChatNVIDIA(model=chat_model, api_key=nv_api_key)
-    problems = ""
+    problems: List[str] = []
     for index, chunk in enumerate(schema_chunks):
         await websocket.send_json(InvokeResponse(
             status="extracting", message=f"extracting schema entries, {index + 1}/{len(schema_chunks)}").model_dump())
@@ -141,28 +167,31 @@ async def compare_schema_with_standard(
         # 对decomposition之后的检查项逐一进行retrieve
         await websocket.send_json(InvokeResponse(
             status="retrieving", message=f"start retrieve standards, {index + 1}/{len(schema_chunks)}").model_dump())
-        retriever = standard_store.as_retriever()
-        retrieved_standards = set()
-        for decomposition_item in decomposition_list:
-            invoked = retriever.invoke(decomposition_item)
-            for doc in invoked:
-                retrieved_standards.add(doc.page_content)
+        retrieved_standards = render_context(assemble_context(
+            standard_store, [str(item) for item in decomposition_list], token_budget=get_context_budget(chat_model)))
 
         # 针对每一个分片进行retrieve+check
         await websocket.send_json(InvokeResponse(
             status="checking", message=f"start retrieve check, {index + 1}/{len(schema_chunks)}").model_dump())
         check_chain = {"scheme": lambda x: chunk.page_content,
                        #"standard": (lambda x: decomposition_str + chunk.page_content) | retriever | RunnableLambda(lambda x: ''.join([y.page_content for y in x]))} | check_prompt | instruct_llm | StrOutputParser()
-                       "standard": (lambda x: '\n'.join(retrieved_standards))} | check_prompt | instruct_llm | StrOutputParser()
-        problems += check_chain.invoke("")
+                       "standard": lambda x: retrieved_standards} | check_prompt | instruct_llm | StrOutputParser()
+        problems.append(check_chain.invoke(""))
 
-    # 如果设计文档被分片了，对所有分片的合规检测结果进行总结
+    # 如果设计文档被分片了，对所有分片的合规检测结果进行分层并行总结
+    result = ''.join(problems)
     if len(schema_chunks) > 1:
         await websocket.send_json(InvokeResponse(
             status="summarizing", message="start summarize all problems").model_dump())
-        summary_chain = {"problem_list": lambda x: problems} | summary_prompt | instruct_llm | StrOutputParser()
-        problems = summary_chain.invoke("")
-    await websocket.send_json(InvokeResponse(status="success", message="success", result=problems).model_dump())
+
+        async def send_summary(level: int, finished: int, total: int, summary: str):
+            await websocket.send_json(InvokeResponse(
+                status="summarizing", message=f"summarizing problems, level {level}, {finished}/{total}",
+                result=summary).model_dump())
+
+        result = await tree_summarize(problems, instruct_llm, token_budget=get_summary_budget(chat_model),
+                                      on_group_done=send_summary)
+    await websocket.send_json(InvokeResponse(status="success", message="success", result=result).model_dump())
     await websocket.close()
     return
 # except Exception as e:
@@ -1,2 +1,5 @@
 from .logging_utils import log_set
-from .nvapi_verify import nvapi_verify
\ No newline at end of file
+from .nvapi_verify import nvapi_verify
+from .context_assembler import assemble_context, render_context, estimate_tokens, get_context_budget, embed_queries
+from .summarizer import tree_summarize, get_summary_budget
+from .answer_cache import answer_cache, AnswerCacheEntry
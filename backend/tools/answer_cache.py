@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ..basic_configs import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY_THRESHOLD
+from .context_assembler import normalize_vectors
+
+
+# 缓存条目: 问题向量、回答及检索到的分片id
+@dataclass
+class AnswerCacheEntry:
+    question: str
+    embedder_model: str
+    vector: np.ndarray
+    answer: str
+    chunk_ids: List[str] = field(default_factory=list)
+
+
+# 按(standard md5, chat model)划分的语义回答缓存，全局按LRU淘汰
+class SemanticAnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple[str, str, int], AnswerCacheEntry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    # 查找与问题向量最相似且超过阈值的缓存回答
+    def lookup(self, standard_md5: str, chat_model: str, embedder_model: str,
+               vector: np.ndarray) -> Optional[AnswerCacheEntry]:
+        vector = normalize_vectors(vector)
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for key, entry in self._entries.items():
+                if key[:2] != (standard_md5, chat_model) or entry.embedder_model != embedder_model \
+                        or entry.vector.shape != vector.shape:
+                    continue
+                score = float(entry.vector @ vector)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key]
+
+    def add(self, standard_md5: str, chat_model: str, entry: AnswerCacheEntry):
+        entry.vector = normalize_vectors(entry.vector)
+        with self._lock:
+            self._entries[(standard_md5, chat_model, self._next_id)] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # standard重新embed后，移除该standard的所有缓存
+    def invalidate(self, standard_md5: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == standard_md5]:
+                del self._entries[key]
+
+
+answer_cache = SemanticAnswerCache()
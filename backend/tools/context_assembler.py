@@ -0,0 +1,156 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from ..basic_configs import (
+    CHUNK_OVERLAP,
+    CONTEXT_TOKEN_BUDGETS,
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    MIN_CHUNK_OVERLAP,
+    MMR_LAMBDA,
+    RETRIEVE_TOP_K
+)
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+# 被选入prompt的检索片段，相邻片段合并后ids/positions会包含多个原始分片
+@dataclass
+class ContextChunk:
+    text: str
+    score: float
+    vector: np.ndarray
+    positions: List[int] = field(default_factory=list)
+    ids: List[str] = field(default_factory=list)
+    metadata: List[Dict[str, Any]] = field(default_factory=list)
+
+
+# 粗略估计token数：中文字符按1个token计，其余字符按4个字符1个token计
+def estimate_tokens(text: str) -> int:
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+# 获取chat model对应的上下文token预算
+def get_context_budget(chat_model: str) -> int:
+    return CONTEXT_TOKEN_BUDGETS.get(chat_model, DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+
+# 按最后一维做L2归一化，零向量保持不变
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+# 批量embed查询语句，返回原始向量，与FAISS索引中的向量保持一致
+def embed_queries(embedder: Embeddings, queries: List[str]) -> np.ndarray:
+    vectors = [embedder.embed_query(query) for query in queries]
+    return np.asarray(vectors, dtype=np.float32)
+
+
+# 计算相邻分片之间由CHUNK_OVERLAP产生的重叠长度，过短的匹配不视为重叠
+def _overlap_length(head: str, tail: str, max_length: int = CHUNK_OVERLAP,
+                    min_length: int = MIN_CHUNK_OVERLAP) -> int:
+    for length in range(min(len(head), len(tail), max_length), min_length - 1, -1):
+        if head.endswith(tail[:length]):
+            return length
+    return 0
+
+
+# 检索所有查询语句的top_k分片，按分片去重并保留最高余弦相似度
+def _retrieve_candidates(store: FAISS, query_vectors: np.ndarray, top_k: int) -> List[ContextChunk]:
+    # 使用原始向量检索，保持与as_retriever()相同的L2排序；仅在计算score时归一化
+    _, indices = store.index.search(query_vectors, top_k)
+    normalized_queries = normalize_vectors(query_vectors)
+    candidates: Dict[int, ContextChunk] = {}
+    for position in {int(i) for i in indices.flatten() if i >= 0}:
+        doc_id = store.index_to_docstore_id[position]
+        doc = store.docstore.search(doc_id)
+        vector = normalize_vectors(np.asarray(store.index.reconstruct(position), dtype=np.float32))
+        candidates[position] = ContextChunk(
+            text=doc.page_content,
+            score=float(np.max(normalized_queries @ vector)),
+            vector=vector,
+            positions=[position],
+            ids=[doc_id],
+            metadata=[doc.metadata]
+        )
+    return sorted(candidates.values(), key=lambda x: x.score, reverse=True)
+
+
+# 判断两个分片是否来自同一文件的同一页，只有同页分片之间才存在CHUNK_OVERLAP
+def _same_page(head: Dict[str, Any], tail: Dict[str, Any]) -> bool:
+    return head.get("source") == tail.get("source") and head.get("page") == tail.get("page")
+
+
+# 合并原文中相邻的分片，去除同页分片的重叠部分
+def _merge_neighbours(candidates: List[ContextChunk], token_budget: int) -> List[ContextChunk]:
+    merged: List[ContextChunk] = []
+    for chunk in sorted(candidates, key=lambda x: x.positions[0]):
+        last = merged[-1] if merged else None
+        if last is not None and last.positions[-1] + 1 == chunk.positions[0]:
+            overlap = _overlap_length(last.text, chunk.text) if _same_page(last.metadata[-1], chunk.metadata[0]) else 0
+            text = last.text + chunk.text[overlap:] if overlap else last.text + '\n' + chunk.text
+            if estimate_tokens(text) <= token_budget:
+                last.text = text
+                last.score = max(last.score, chunk.score)
+                last.vector = normalize_vectors(last.vector + chunk.vector)
+                last.positions.extend(chunk.positions)
+                last.ids.extend(chunk.ids)
+                last.metadata.extend(chunk.metadata)
+                continue
+        merged.append(chunk)
+    return merged
+
+
+# Maximal Marginal Relevance排序，兼顾相关性与多样性
+def _mmr_rank(candidates: List[ContextChunk], mmr_lambda: float) -> List[ContextChunk]:
+    remaining = list(candidates)
+    ranked: List[ContextChunk] = []
+    while remaining:
+        def mmr_score(chunk: ContextChunk) -> float:
+            redundancy = max((float(chunk.vector @ x.vector) for x in ranked), default=0.0)
+            return mmr_lambda * chunk.score - (1 - mmr_lambda) * redundancy
+
+        best = max(remaining, key=mmr_score)
+        remaining.remove(best)
+        ranked.append(best)
+    return ranked
+
+
+# 检索、合并、MMR排序并在token预算内装填上下文，返回结果按原文顺序排列
+def assemble_context(
+        store: FAISS,
+        queries: List[str],
+        token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+        top_k: int = RETRIEVE_TOP_K,
+        mmr_lambda: float = MMR_LAMBDA,
+        query_vectors: Optional[np.ndarray] = None
+) -> List[ContextChunk]:
+    queries = [query for query in queries if query.strip()]
+    if query_vectors is None:
+        if not queries:
+            return []
+        query_vectors = embed_queries(store.embeddings, queries)
+
+    candidates = _merge_neighbours(_retrieve_candidates(store, query_vectors, top_k), token_budget)
+    selected: List[ContextChunk] = []
+    used_tokens = 0
+    for chunk in _mmr_rank(candidates, mmr_lambda):
+        chunk_tokens = estimate_tokens(chunk.text)
+        if used_tokens + chunk_tokens > token_budget:
+            continue
+        selected.append(chunk)
+        used_tokens += chunk_tokens
+    logging.debug(f"assembled context: {len(selected)}/{len(candidates)} chunks, {used_tokens}/{token_budget} tokens")
+    return sorted(selected, key=lambda x: x.positions[0])
+
+
+# 将上下文片段拼接为prompt文本
+def render_context(chunks: List[ContextChunk]) -> str:
+    return '\n'.join([chunk.text for chunk in chunks])
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+
+from ..basic_configs import DEFAULT_SUMMARY_TOKEN_BUDGET, SUMMARY_MAX_CONCURRENCY, SUMMARY_TOKEN_BUDGETS
+from ..prompt_template import summary_prompt
+from .context_assembler import estimate_tokens
+
+# 回调参数: (层级, 已完成的分组数, 该层分组总数, 分组总结结果)
+GroupCallback = Callable[[int, int, int, str], Awaitable[None]]
+
+
+# 获取chat model单次总结的输入token预算
+def get_summary_budget(chat_model: str) -> int:
+    return SUMMARY_TOKEN_BUDGETS.get(chat_model, DEFAULT_SUMMARY_TOKEN_BUDGET)
+
+
+# 在token预算内将结果分组；单独超出预算的结果或末尾落单的结果作为单项分组
+def group_by_budget(results: List[str], token_budget: int) -> List[List[str]]:
+    groups: List[List[str]] = []
+    group: List[str] = []
+    group_tokens = 0
+    for result in results:
+        result_tokens = estimate_tokens(result)
+        if group and group_tokens + result_tokens > token_budget:
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(result)
+        group_tokens += result_tokens
+    if group:
+        groups.append(group)
+    return groups
+
+
+# 分层并行map-reduce总结：分组并行总结，逐层递归直到只剩一个结果
+async def tree_summarize(
+        results: List[str],
+        llm: BaseChatModel,
+        token_budget: int = DEFAULT_SUMMARY_TOKEN_BUDGET,
+        max_concurrency: int = SUMMARY_MAX_CONCURRENCY,
+        on_group_done: Optional[GroupCallback] = None
+) -> str:
+    results = [result for result in results if result.strip()]
+    if not results:
+        return ""
+    summary_chain = summary_prompt | llm | StrOutputParser()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def summarize_group(index: int, group: List[str]) -> Tuple[int, str]:
+        async with semaphore:
+            return index, await summary_chain.ainvoke({"problem_list": '\n'.join(group)})
+
+    level = 0
+    shrinking = False
+    while len(results) > 1:
+        groups = group_by_budget(results, token_budget)
+        if all(len(group) == 1 for group in groups):
+            if shrinking:
+                # 单独总结后仍无法在预算内合并，退化为相邻两两合并
+                groups = [results[i:i + 2] for i in range(0, len(results), 2)]
+                shrinking = False
+            else:
+                # 没有可合并的分组，先单独总结每个结果使其缩短，再重新分组
+                shrinking = True
+        else:
+            shrinking = False
+        # 多项分组与超出预算的单项分组需要总结，其余单项分组直接进入下一层
+        summarize_indices = [index for index, group in enumerate(groups)
+                             if shrinking or len(group) > 1 or estimate_tokens(group[0]) > token_budget]
+        level += 1
+        logging.debug(f"summarize level {level}: {len(results)} results -> {len(groups)} groups, "
+                      f"{len(summarize_indices)} to summarize")
+        summaries: List[str] = [group[0] for group in groups]
+        tasks = [asyncio.ensure_future(summarize_group(index, groups[index])) for index in summarize_indices]
+        try:
+            for finished, task in enumerate(asyncio.as_completed(tasks), start=1):
+                index, summary = await task
+                summaries[index] = summary
+                if on_group_done is not None:
+                    await on_group_done(level, finished, len(tasks), summary)
+        finally:
+            # 出错或websocket断开时取消未完成的分组
+            for task in tasks:
+                task.cancel()
+        results = summaries
+    return results[0]